@@ -18,6 +18,9 @@ The following API niceties are also included:
 
     * all blocking methods take a "timeout" argument and return a success code
     * all exposed objects are actual classes and can be safely subclassed
+    * SHLock can optionally cap the number of simultaneous shared owners
+    * RangeSHLock locks ranges of a resource, so that disjoint ranges can be
+      locked exclusively in parallel
 
 """
 import sys
@@ -26,11 +29,12 @@ if sys.version_info < _MIN_PYTHON:
     sys.exit("Python {}.{} or later is required.".format(_MIN_PYTHON[0], _MIN_PYTHON[1]))
 
 __ver_major__ = 0
-__ver_minor__ = 5
-__ver_patch__ = 1
+__ver_minor__ = 6
+__ver_patch__ = 0
 __ver_sub__ = ""
 __version__ = "{0}.{1}.{2}{3}".format(__ver_major__, __ver_minor__, __ver_patch__, __ver_sub__)
 
 from rwlock.rw_lock import *
+from rwlock.range_lock import *
 
-__all__ = ["Condition", "Lock", "RLock", "SHLock"]
+__all__ = ["Condition", "Lock", "RLock", "SHLock", "RangeSHLock"]
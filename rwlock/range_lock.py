@@ -0,0 +1,376 @@
+import itertools
+import random
+import threading
+
+from rwlock.rw_lock import Condition, Lock, _ContextManagerMixin
+
+__all__ = ["RangeSHLock"]
+
+# Source of treap priorities, shared by all trees: seeding a new generator
+# for every tree would be far more costly than the tree itself.
+_priorities = random.Random()
+
+
+class _IntervalNode(object):
+    """A node of an _IntervalTree."""
+
+    __slots__ = ("start", "end", "seq", "item", "priority",
+                 "max_end", "min_seq", "left", "right")
+
+    def __init__(self, start, end, seq, item, priority):
+        self.start = start
+        self.end = end
+        self.seq = seq
+        self.item = item
+        self.priority = priority
+        self.max_end = end
+        self.min_seq = seq
+        self.left = None
+        self.right = None
+
+    def update(self):
+        max_end = self.end
+        min_seq = self.seq
+        for child in (self.left, self.right):
+            if child is not None:
+                if child.max_end > max_end:
+                    max_end = child.max_end
+                if child.min_seq < min_seq:
+                    min_seq = child.min_seq
+        self.max_end = max_end
+        self.min_seq = min_seq
+
+
+class _IntervalTree(object):
+    """Set of half-open intervals [start, end) supporting fast overlap queries.
+
+    This is a treap ordered by (start, seq), where each node also records the
+    largest end point and the smallest seq in its subtree.  The seq of each
+    interval is supplied by the caller and must be unique within the tree.
+    Insertion, removal and finding an interval that overlaps a given one all
+    take O(log n) expected time.  Restricting the search to intervals with
+    an earlier seq, or finding all k overlapping intervals, takes up to
+    O(k + log n) expected time instead.
+    """
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, start, end, seq, item):
+        """Add the interval [start, end) and return a key for remove()."""
+        node = _IntervalNode(start, end, seq, item, _priorities.random())
+        self._root = self._insert(self._root, node)
+        self._size += 1
+        return (start, node.seq)
+
+    def remove(self, key):
+        """Remove the interval with the given key, as returned by insert()."""
+        self._root = self._remove(self._root, key)
+        self._size -= 1
+
+    def find_overlap(self, start, end, before=None):
+        """Return the item of some interval overlapping [start, end), or None.
+
+        If "before" is given, only intervals whose seq is less than it count;
+        the search may then have to step over overlapping intervals with a
+        later seq.
+        """
+        if before is not None:
+            return next(self._overlaps(self._root, start, end, before), None)
+        node = self._root
+        while node is not None:
+            if node.start < end and start < node.end:
+                return node.item
+            # If anything in the left subtree reaches past start, then either
+            # it overlaps us or everything from there on starts after end.
+            if node.left is not None and node.left.max_end > start:
+                node = node.left
+            elif node.start < end:
+                node = node.right
+            else:
+                return None
+        return None
+
+    def find_all_overlaps(self, start, end):
+        """Return the items of all intervals overlapping [start, end)."""
+        return list(self._overlaps(self._root, start, end, None))
+
+    def _overlaps(self, node, start, end, before):
+        # An in-order walk that skips subtrees which cannot hold a match:
+        # those ending at or before start, or with every seq too late.
+        if node is None or node.max_end <= start:
+            return
+        if before is not None and node.min_seq >= before:
+            return
+        yield from self._overlaps(node.left, start, end, before)
+        # Everything from here on starts at or after end.
+        if node.start >= end:
+            return
+        if start < node.end and (before is None or node.seq < before):
+            yield node.item
+        yield from self._overlaps(node.right, start, end, before)
+
+    def _insert(self, root, node):
+        if root is None:
+            return node
+        if (node.start, node.seq) < (root.start, root.seq):
+            root.left = self._insert(root.left, node)
+            if root.left.priority > root.priority:
+                root = self._rotate_right(root)
+        else:
+            root.right = self._insert(root.right, node)
+            if root.right.priority > root.priority:
+                root = self._rotate_left(root)
+        root.update()
+        return root
+
+    def _remove(self, root, key):
+        if root is None:
+            raise KeyError(key)
+        root_key = (root.start, root.seq)
+        if key < root_key:
+            root.left = self._remove(root.left, key)
+        elif key > root_key:
+            root.right = self._remove(root.right, key)
+        else:
+            if root.left is None:
+                return root.right
+            if root.right is None:
+                return root.left
+            # Rotate the node down towards a leaf, then remove it there.
+            if root.left.priority > root.right.priority:
+                root = self._rotate_right(root)
+                root.right = self._remove(root.right, key)
+            else:
+                root = self._rotate_left(root)
+                root.left = self._remove(root.left, key)
+        root.update()
+        return root
+
+    @staticmethod
+    def _rotate_right(root):
+        pivot = root.left
+        root.left = pivot.right
+        pivot.right = root
+        root.update()
+        pivot.update()
+        return pivot
+
+    @staticmethod
+    def _rotate_left(root):
+        pivot = root.right
+        root.right = pivot.left
+        pivot.left = root
+        root.update()
+        pivot.update()
+        return pivot
+
+
+class _RangeRequest(object):
+    """A request for (or a grant of) a range of a RangeSHLock."""
+
+    __slots__ = ("start", "end", "shared", "owner", "seq",
+                 "waiter", "key", "granted")
+
+    def __init__(self, start, end, shared, owner, seq):
+        self.start = start
+        self.end = end
+        self.shared = shared
+        self.owner = owner
+        self.seq = seq
+        self.waiter = None
+        self.key = None
+        self.granted = False
+
+
+class RangeSHLock(object):
+    """Shareable lock over ranges of some resource.
+
+    This works like an SHLock, except that every acquisition names the
+    half-open range [start, end) that it covers, e.g. a slice of a buffer.
+    Requests for overlapping ranges follow the usual shared/exclusive rules,
+    while requests for ranges that do not overlap never block each other.
+    Conflicts are found with interval trees, so an acquisition that does
+    not have to wait takes O(log n) expected time in the number of held and
+    waiting ranges.  Releasing a range only looks at the k waiting requests
+    that overlap it, but checking each of them against the requests queued
+    ahead of it may cost up to O(k + log n), so releases get slower (up to
+    O(k^2)) when many requests pile up on one region.
+
+    As with SHLock the lock is fair: once an exclusive request is waiting,
+    later requests for ranges overlapping it will queue up behind it.  Also
+    as with SHLock, a thread that already holds a shared range may acquire
+    overlapping ranges in shared mode again without queueing behind waiting
+    exclusive requests.  Any other overlapping request for a range a thread
+    already holds (that is, anything involving exclusive mode) will
+    deadlock (or time out).
+    """
+
+    class Context(_ContextManagerMixin):
+
+        def __init__(self, parent, start, end,
+                     blocking=True, timeout=None, shared=False):
+            self.parent = parent
+            self.start = start
+            self.end = end
+            self.blocking = blocking
+            self.timeout = timeout
+            self.shared = shared
+
+        def acquire(self):
+            self.parent.acquire(self.start, self.end,
+                                blocking=self.blocking,
+                                timeout=self.timeout,
+                                shared=self.shared)
+
+        def release(self):
+            self.parent.release(self.start, self.end)
+
+    _LockClass = Lock
+    _ConditionClass = Condition
+    _IntervalTreeClass = _IntervalTree
+
+    def __init__(self):
+        self._lock = self._LockClass()
+        # Every request gets a sequence number; for waiting requests this
+        # gives their arrival order.
+        self._seq = itertools.count()
+        # Ranges that have been granted, split up by mode, and a map from
+        # (thread, start, end) to the list of matching grants so that
+        # release() can find them again.  Each thread's shared ranges are
+        # also kept in a tree of their own, to spot re-entrant requests.
+        self._shared_held = self._IntervalTreeClass()
+        self._exclusive_held = self._IntervalTreeClass()
+        self._owners = {}
+        self._shared_owned = {}
+        # Ranges of requests that are waiting, so that newcomers can queue
+        # up behind them.
+        self._shared_waiting = self._IntervalTreeClass()
+        self._exclusive_waiting = self._IntervalTreeClass()
+        # This is for recycling waiter objects.
+        self._free_waiters = []
+
+    def __call__(self, start, end, blocking=True, timeout=None, shared=False):
+        return RangeSHLock.Context(self, start, end, blocking=blocking,
+                                   timeout=timeout, shared=shared)
+
+    def acquire(self, start, end, blocking=True, timeout=None, shared=False):
+        """Acquire the range [start, end) in shared or exclusive mode.
+
+        Returns True if the range was successfully acquired and False
+        otherwise, with "blocking" and "timeout" behaving as for Lock.
+        """
+        if not start < end:
+            raise ValueError("range start must be less than its end")
+        me = threading.current_thread()
+        with self._lock:
+            request = _RangeRequest(start, end, shared, me, next(self._seq))
+            if (not self._conflicts(request, self._shared_held, self._exclusive_held) and
+                    not self._queued_behind(request)):
+                self._grant(request)
+                return True
+            if not blocking:
+                return False
+            request.waiter = self._take_waiter()
+            try:
+                self._enqueue(request)
+                if not request.waiter.wait(timeout=timeout) and not request.granted:
+                    self._dequeue(request)
+                    # Others may have been queued up behind us.
+                    self._wake_waiting(start, end)
+                    return False
+                assert request.granted
+                return True
+            finally:
+                self._return_waiter(request.waiter)
+                request.waiter = None
+
+    def release(self, start, end):
+        """Release the range [start, end) acquired by the current thread."""
+        me = threading.current_thread()
+        with self._lock:
+            try:
+                requests = self._owners[(me, start, end)]
+            except KeyError:
+                raise RuntimeError("release() called on un-acquired range")
+            request = requests.pop()
+            if not requests:
+                del self._owners[(me, start, end)]
+            if request.shared:
+                self._shared_held.remove(request.key)
+                owned = self._shared_owned[me]
+                owned.remove(request.key)
+                if not len(owned):
+                    del self._shared_owned[me]
+            else:
+                self._exclusive_held.remove(request.key)
+            self._wake_waiting(start, end)
+
+    def _conflicts(self, request, shared_tree, exclusive_tree, before=None):
+        if exclusive_tree.find_overlap(request.start, request.end, before) is not None:
+            return True
+        if request.shared:
+            return False
+        return shared_tree.find_overlap(request.start, request.end, before) is not None
+
+    def _queued_behind(self, request, before=None):
+        # A shared request overlapping a shared range its thread already
+        # holds must not queue behind exclusives that are waiting on that.
+        if request.shared:
+            owned = self._shared_owned.get(request.owner)
+            if owned is not None and owned.find_overlap(request.start, request.end) is not None:
+                return False
+        return self._conflicts(request, self._shared_waiting, self._exclusive_waiting,
+                               before=before)
+
+    def _grant(self, request):
+        if request.shared:
+            request.key = self._shared_held.insert(request.start, request.end,
+                                                   request.seq, request)
+            if request.owner not in self._shared_owned:
+                self._shared_owned[request.owner] = self._IntervalTreeClass()
+            self._shared_owned[request.owner].insert(request.start, request.end,
+                                                     request.seq, request)
+        else:
+            request.key = self._exclusive_held.insert(request.start, request.end,
+                                                      request.seq, request)
+        request.granted = True
+        self._owners.setdefault((request.owner, request.start, request.end), []).append(request)
+
+    def _enqueue(self, request):
+        tree = self._shared_waiting if request.shared else self._exclusive_waiting
+        request.key = tree.insert(request.start, request.end, request.seq, request)
+
+    def _dequeue(self, request):
+        tree = self._shared_waiting if request.shared else self._exclusive_waiting
+        tree.remove(request.key)
+
+    def _wake_waiting(self, start, end):
+        # Only waiting requests overlapping [start, end) can have been held
+        # up by that range, so hand out ranges to those, in arrival order.  A
+        # request is granted if it conflicts neither with a held range nor
+        # with an earlier request that is still waiting; this keeps things
+        # fair.  Granting a range never unblocks anyone else.
+        candidates = (self._shared_waiting.find_all_overlaps(start, end) +
+                      self._exclusive_waiting.find_all_overlaps(start, end))
+        candidates.sort(key=lambda r: r.seq)
+        for request in candidates:
+            if (self._conflicts(request, self._shared_held, self._exclusive_held) or
+                    self._queued_behind(request, before=request.seq)):
+                continue
+            self._dequeue(request)
+            self._grant(request)
+            request.waiter.notify()
+
+    def _take_waiter(self):
+        try:
+            return self._free_waiters.pop()
+        except IndexError:
+            return self._ConditionClass(self._lock)
+
+    def _return_waiter(self, waiter):
+        self._free_waiters.append(waiter)
@@ -162,6 +162,12 @@ class SHLock(_ContextManagerMixin):
 
     Currently attempting to upgrade or downgrade between shared and exclusive
     locks will cause a deadlock.  This restriction may go away in future.
+
+    The optional "max_shared" argument caps the number of threads that may
+    hold the lock in shared mode at the same time; further shared requests
+    are queued until a slot frees up.  The cap can be changed at runtime by
+    assigning to the "max_shared" property.  Re-entrant shared acquisitions
+    by a thread that already holds the lock never count against the cap.
     """
 
     class Context(_ContextManagerMixin):
@@ -184,8 +190,11 @@ class SHLock(_ContextManagerMixin):
     _LockClass = Lock
     _ConditionClass = Condition
 
-    def __init__(self):
+    def __init__(self, max_shared=None):
         self._lock = self._LockClass()
+        # The maximum number of threads that may hold a shared lock at
+        # once, or None for no limit.
+        self._max_shared = self._check_max_shared(max_shared)
         # When a shared lock is held, is_shared will give the cumulative
         # number of locks and _shared_owners maps each owning thread to
         # the number of locks is holds.
@@ -207,14 +216,35 @@ class SHLock(_ContextManagerMixin):
         return SHLock.Context(self, blocking=blocking,
                               timeout=timeout, shared=shared)
 
+    @property
+    def max_shared(self):
+        """The maximum number of simultaneous shared owners (None if unlimited)."""
+        return self._max_shared
+
+    @max_shared.setter
+    def max_shared(self, value):
+        # Lowering the cap never revokes locks that are already held; it just
+        # stops new shared owners from being admitted until enough of the
+        # current ones have released.  Raising it may let queued ones in now.
+        value = self._check_max_shared(value)
+        with self._lock:
+            self._max_shared = value
+            if not self.is_exclusive and not self._exclusive_queue:
+                self._wake_shared()
+
     def acquire(self, blocking=True, timeout=None, shared=False):
-        """Acquire the lock in shared or exclusive mode."""
+        """Acquire the lock in shared or exclusive mode.
+
+        Returns True if the lock was successfully acquired and False
+        otherwise, with "blocking" and "timeout" behaving as for Lock.
+        """
         with self._lock:
             if shared:
-                self._acquire_shared(blocking, timeout)
+                acquired = self._acquire_shared(blocking, timeout)
             else:
-                self._acquire_exclusive(blocking, timeout)
+                acquired = self._acquire_exclusive(blocking, timeout)
             assert not (self.is_shared and self.is_exclusive)
+            return acquired
 
     def release(self):
         """Release the lock."""
@@ -229,14 +259,10 @@ class SHLock(_ContextManagerMixin):
                 self.is_exclusive -= 1
                 if not self.is_exclusive:
                     self._exclusive_owner = None
-                    # If there are waiting shared locks, issue it to them
-                    # all and then wake everyone up.
+                    # If there are waiting shared locks, issue it to as
+                    # many of them as max_shared allows and wake them up.
                     if self._shared_queue:
-                        for (thread, waiter) in self._shared_queue:
-                            self.is_shared += 1
-                            self._shared_owners[thread] = 1
-                            waiter.notify()
-                        del self._shared_queue[:]
+                        self._wake_shared()
                     # Otherwise, if there are waiting exclusive locks,
                     # they get first dibs on the lock.
                     elif self._exclusive_queue:
@@ -260,7 +286,15 @@ class SHLock(_ContextManagerMixin):
                         self.is_exclusive += 1
                         waiter.notify()
                     else:
-                        assert not self._shared_queue
+                        # With max_shared, some shared locks may have to
+                        # keep waiting, but at least one must get in.
+                        self._wake_shared()
+                        assert self.is_shared or not self._shared_queue
+                # If we gave up a shared slot, pass it on to the next waiting
+                # shared lock, unless an exclusive lock is waiting; in that case
+                # we let the shared locks drain so that it gets its turn.
+                elif me not in self._shared_owners and not self._exclusive_queue:
+                    self._wake_shared()
             else:
                 raise RuntimeError("release() called on un-acquired lock")
 
@@ -271,9 +305,12 @@ class SHLock(_ContextManagerMixin):
             self.is_shared += 1
             self._shared_owners[me] += 1
             return True
-        # If the lock is already spoken for by an exclusive, add us
-        # to the shared queue and it will give us the lock eventually.
-        if self.is_exclusive or self._exclusive_queue:
+        # If the lock is already spoken for by an exclusive, or all the
+        # shared slots are taken (or promised to someone queued ahead of
+        # us), add us to the shared queue and it will give us the lock
+        # eventually.
+        if (self.is_exclusive or self._exclusive_queue or
+                self._shared_queue or self._shared_full()):
             if self._exclusive_owner is me:
                 raise RuntimeError("can't downgrade SHLock object")
             if not blocking:
@@ -281,7 +318,9 @@ class SHLock(_ContextManagerMixin):
             waiter = self._take_waiter()
             try:
                 self._shared_queue.append((me, waiter))
-                if not waiter.wait(timeout=timeout):
+                # We may have been handed the lock just as the wait timed
+                # out, before we could take back self._lock; if so, keep it.
+                if not waiter.wait(timeout=timeout) and me not in self._shared_owners:
                     self._shared_queue.remove((me, waiter))
                     return False
                 assert not self.is_exclusive
@@ -290,6 +329,7 @@ class SHLock(_ContextManagerMixin):
         else:
             self.is_shared += 1
             self._shared_owners[me] = 1
+        return True
 
     def _acquire_exclusive(self, blocking=True, timeout=None):
         me = threading.currentThread()
@@ -306,14 +346,43 @@ class SHLock(_ContextManagerMixin):
             waiter = self._take_waiter()
             try:
                 self._exclusive_queue.append((me, waiter))
-                if not waiter.wait(timeout=timeout):
+                # As for shared locks, we may have been handed the lock just
+                # as the wait timed out.
+                if not waiter.wait(timeout=timeout) and self._exclusive_owner is not me:
                     self._exclusive_queue.remove((me, waiter))
+                    # Shared locks may have been held back on our account.
+                    if not self.is_exclusive and not self._exclusive_queue:
+                        self._wake_shared()
                     return False
             finally:
                 self._return_waiter(waiter)
         else:
             self._exclusive_owner = me
             self.is_exclusive += 1
+        return True
+
+    def _shared_full(self):
+        return (self._max_shared is not None and
+                len(self._shared_owners) >= self._max_shared)
+
+    def _wake_shared(self):
+        # Issue the lock to waiting shared locks in queue order, until
+        # either the queue is empty or max_shared has been reached.
+        while self._shared_queue and not self._shared_full():
+            (thread, waiter) = self._shared_queue.pop(0)
+            self.is_shared += 1
+            self._shared_owners[thread] = 1
+            waiter.notify()
+
+    @staticmethod
+    def _check_max_shared(value):
+        if value is None:
+            return value
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError("max_shared must be None or a positive integer")
+        if value < 1:
+            raise ValueError("max_shared must be None or a positive integer")
+        return value
 
     def _take_waiter(self):
         try:
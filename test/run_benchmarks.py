@@ -0,0 +1,136 @@
+# Copyright (C) 2020 Ankan Pramanick - All rights reserved.
+"""
+Runs the benchmarks comparing RangeSHLock with SHLock.
+
+Each benchmark starts a number of writer threads that each repeatedly write to their own
+partition of a shared buffer; the "work" done while holding the lock is a sleep, standing in
+for operations that release the GIL (numpy, I/O on mmapped files, etc.).  With SHLock all of
+the writers serialize, while with RangeSHLock writers to disjoint partitions run in parallel.
+
+Note that this MUST be invoked from the directory in which this script is located.
+"""
+import argparse
+import collections
+import os
+import sys
+import threading
+import time
+
+
+CmdLineArgs = collections.namedtuple("CmdLineArgs",
+                                     ["threads",     # int
+                                      "iterations",  # int
+                                      "work"])       # float
+
+
+def _add_code_root():
+    """
+    Adds the root of the code tree (that is being benchmarked) to the head of sys.path.
+
+    See the identically named function in run_unit_tests.py for why this is needed.
+    """
+    parent_dir_of_this_script = os.path.dirname(os.path.realpath(__file__))
+    path_to_main_code_root = os.path.realpath(os.path.join(parent_dir_of_this_script, ".."))
+    sys.path.insert(0, path_to_main_code_root)
+
+
+def _parse_command_line():
+    """
+    Parses the command line for this script.
+
+    @return CmdLineArgs: An object encapsulating the values for the command line args.
+    """
+    def formatter(prog): return argparse.ArgumentDefaultsHelpFormatter(prog,
+                                                                       max_help_position=36)
+
+    # noinspection PyTypeChecker
+    parser = argparse.ArgumentParser(
+        formatter_class=formatter,
+        description="Runs benchmarks for rwlock.")
+    parser.add_argument("-t", "--threads",
+                        metavar="VAL",
+                        type=int,
+                        default="8",
+                        help="the number of writer threads (and buffer partitions)")
+    parser.add_argument("-i", "--iterations",
+                        metavar="VAL",
+                        type=int,
+                        default="200",
+                        help="the number of writes done by each writer thread")
+    parser.add_argument("-w", "--work",
+                        metavar="SECS",
+                        type=float,
+                        default="0.001",
+                        help="the time spent working while holding the lock, per write")
+    args = parser.parse_args()
+    return CmdLineArgs(threads=args.threads, iterations=args.iterations, work=args.work)
+
+
+def _run_partitioned_writers(acquire, release, args):
+    """
+    Runs one writer per partition and times how long it takes for all of them to finish.
+
+    @param callable acquire: Called as acquire(start, end) to lock a partition.
+    @param callable release: Called as release(start, end) to unlock a partition.
+    @param CmdLineArgs args: The benchmark parameters.
+    @return float: The elapsed wall-clock time, in seconds.
+    """
+    partition_size = 4096
+
+    def writer(index):
+        start = index * partition_size
+        end = start + partition_size
+        for _ in range(args.iterations):
+            acquire(start, end)
+            try:
+                time.sleep(args.work)
+            finally:
+                release(start, end)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.threads)]
+    start_time = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start_time
+
+
+def _run_benchmarks(args):
+    """
+    Runs the benchmarks and prints the results.
+
+    @param CmdLineArgs args: The benchmark parameters.
+    """
+    # The following import only works after _add_code_root():
+    from rwlock import RangeSHLock, SHLock
+
+    sh_lock = SHLock()
+    range_lock = RangeSHLock()
+    results = [
+        ("SHLock", _run_partitioned_writers(lambda start, end: sh_lock.acquire(),
+                                            lambda start, end: sh_lock.release(),
+                                            args)),
+        ("RangeSHLock", _run_partitioned_writers(range_lock.acquire, range_lock.release,
+                                                 args)),
+    ]
+    total_writes = args.threads * args.iterations
+    print("{} writer threads x {} writes, {:.4f}s of work per write".format(
+        args.threads, args.iterations, args.work))
+    for (name, elapsed) in results:
+        print("    {:<12} {:8.3f}s  {:10.1f} writes/s".format(name, elapsed,
+                                                             total_writes / elapsed))
+
+
+def main():
+    """The main entry point."""
+    _add_code_root()
+    cmd_line_args = _parse_command_line()
+    print("Running benchmarks for rwlock ...")
+    print("[Using {}]".format(sys.executable))
+    _run_benchmarks(cmd_line_args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+# Copyright (C) 2020 Ankan Pramanick - All rights reserved.
+import random
+import threading
+import time
+import unittest
+
+from rwlock import RangeSHLock
+from rwlock.range_lock import _IntervalTree
+
+
+class _TestThread1(threading.Thread):
+    """A thread that holds a range of a RangeSHLock until it is told to let go."""
+
+    def __init__(self, lock, start, end, shared, name):
+        """Ctor.
+
+        @param RangeSHLock lock: The lock to acquire.
+        @param int start:        Start of the range to acquire.
+        @param int end:          End (exclusive) of the range to acquire.
+        @param bool shared:      Whether to acquire the range in shared mode.
+        @param str name:         Thread name.
+        """
+        threading.Thread.__init__(self, name=name)
+        self.lock = lock
+        self.start_ = start
+        self.end_ = end
+        self.shared = shared
+        self.acquired = threading.Event()
+        self.done = threading.Event()
+
+    def run(self):
+        with self.lock(self.start_, self.end_, shared=self.shared):
+            self.acquired.set()
+            self.done.wait(timeout=5)
+
+
+class IntervalTreeTest(unittest.TestCase):
+    """Unit tests for the interval tree behind RangeSHLock."""
+
+    def test_against_brute_force(self):
+        rng = random.Random(1234)
+        tree = _IntervalTree()
+        held = {}
+        for i in range(2000):
+            if held and rng.random() < 0.4:
+                key = rng.choice(list(held))
+                tree.remove(key)
+                del held[key]
+            else:
+                start = rng.randint(0, 1000)
+                end = start + rng.randint(1, 50)
+                held[tree.insert(start, end, i, (start, end, i))] = (start, end, i)
+            self.assertEqual(len(held), len(tree))
+            q_start = rng.randint(0, 1000)
+            q_end = q_start + rng.randint(1, 50)
+            expected = [r for r in held.values() if r[0] < q_end and q_start < r[1]]
+            found = tree.find_overlap(q_start, q_end)
+            if expected:
+                self.assertIn(found, expected)
+            else:
+                self.assertIsNone(found)
+            self.assertEqual(sorted(expected), sorted(tree.find_all_overlaps(q_start, q_end)))
+            before = rng.randint(0, i + 1)
+            found = tree.find_overlap(q_start, q_end, before)
+            expected = [r for r in expected if r[2] < before]
+            if expected:
+                self.assertIn(found, expected)
+            else:
+                self.assertIsNone(found)
+
+    def test_half_open(self):
+        tree = _IntervalTree()
+        tree.insert(10, 20, 0, "a")
+        self.assertIsNone(tree.find_overlap(0, 10))
+        self.assertIsNone(tree.find_overlap(20, 30))
+        self.assertEqual("a", tree.find_overlap(19, 30))
+
+
+class RangeSHLockTest(unittest.TestCase):
+    """Unit tests for RangeSHLock."""
+
+    def _finish(self, threads):
+        for t in threads:
+            t.done.set()
+        for t in threads:
+            t.join(timeout=2)
+            self.assertFalse(t.is_alive())
+
+    def test_disjoint_exclusive_ranges_in_parallel(self):
+        lock = RangeSHLock()
+        writers = [_TestThread1(lock, i * 10, (i + 1) * 10, False, "Writer {}".format(i))
+                   for i in range(5)]
+        for t in writers:
+            t.start()
+        for t in writers:
+            self.assertTrue(t.acquired.wait(timeout=1))
+        self._finish(writers)
+
+    def test_overlapping_exclusive_blocks(self):
+        lock = RangeSHLock()
+        self.assertTrue(lock.acquire(0, 10))
+        w = _TestThread1(lock, 5, 15, False, "Writer")
+        w.start()
+        self.assertFalse(w.acquired.wait(timeout=0.1))
+        lock.release(0, 10)
+        self.assertTrue(w.acquired.wait(timeout=1))
+        self._finish([w])
+
+    def test_shared_ranges_coexist(self):
+        lock = RangeSHLock()
+        self.assertTrue(lock.acquire(0, 10, shared=True))
+        r = _TestThread1(lock, 5, 15, True, "Reader")
+        r.start()
+        self.assertTrue(r.acquired.wait(timeout=1))
+        self.assertFalse(lock.acquire(8, 9, blocking=False))
+        self._finish([r])
+        lock.release(0, 10)
+        self.assertTrue(lock.acquire(8, 9, blocking=False))
+        lock.release(8, 9)
+
+    def test_timeout(self):
+        lock = RangeSHLock()
+        lock.acquire(0, 10)
+        result = []
+        t = threading.Thread(target=lambda: result.append(lock.acquire(0, 1, timeout=0.05,
+                                                                       shared=True)))
+        start = time.time()
+        t.start()
+        t.join(timeout=2)
+        self.assertEqual([False], result)
+        self.assertGreaterEqual(time.time() - start, 0.05)
+        self.assertFalse(len(lock._shared_waiting))
+        lock.release(0, 10)
+
+    def test_waiting_writer_blocks_later_readers(self):
+        lock = RangeSHLock()
+        r1 = _TestThread1(lock, 0, 10, True, "Reader 1")
+        r1.start()
+        self.assertTrue(r1.acquired.wait(timeout=1))
+        w = _TestThread1(lock, 5, 15, False, "Writer")
+        w.start()
+        time.sleep(0.05)
+        r2 = _TestThread1(lock, 10, 20, True, "Reader 2")
+        r2.start()
+        # Reader 2 only overlaps the waiting writer, but must still queue behind it:
+        self.assertFalse(r2.acquired.wait(timeout=0.1))
+        # A reader that overlaps nothing pending can go straight in:
+        self.assertTrue(lock.acquire(20, 30, blocking=False, shared=True))
+        lock.release(20, 30)
+        r1.done.set()
+        self.assertTrue(w.acquired.wait(timeout=1))
+        self.assertFalse(r2.acquired.is_set())
+        w.done.set()
+        self.assertTrue(r2.acquired.wait(timeout=1))
+        self._finish([r1, w, r2])
+
+    def test_reentrant_shared_with_writer_waiting(self):
+        lock = RangeSHLock()
+        self.assertTrue(lock.acquire(0, 10, shared=True))
+        w = _TestThread1(lock, 5, 15, False, "Writer")
+        w.start()
+        time.sleep(0.05)
+        # We already hold an overlapping shared range, so we must not queue
+        # behind the writer (which is waiting on us):
+        self.assertTrue(lock.acquire(0, 10, timeout=0.1, shared=True))
+        self.assertTrue(lock.acquire(8, 20, timeout=0.1, shared=True))
+        # But a thread holding nothing there still has to wait its turn:
+        result = []
+        t = threading.Thread(target=lambda: result.append(lock.acquire(0, 10, timeout=0.05,
+                                                                       shared=True)))
+        t.start()
+        t.join(timeout=2)
+        self.assertEqual([False], result)
+        lock.release(8, 20)
+        lock.release(0, 10)
+        self.assertFalse(w.acquired.is_set())
+        lock.release(0, 10)
+        self.assertTrue(w.acquired.wait(timeout=1))
+        self._finish([w])
+        self.assertFalse(lock._shared_owned)
+
+    def test_release_wakes_waiters_in_order(self):
+        lock = RangeSHLock()
+        self.assertTrue(lock.acquire(0, 100))
+        w1 = _TestThread1(lock, 0, 10, False, "Writer 1")
+        w1.start()
+        time.sleep(0.05)
+        r1 = _TestThread1(lock, 5, 50, True, "Reader 1")
+        r1.start()
+        time.sleep(0.05)
+        r2 = _TestThread1(lock, 20, 30, True, "Reader 2")
+        r2.start()
+        time.sleep(0.05)
+        # Releasing an unrelated range wakes nobody:
+        self.assertTrue(lock.acquire(200, 300))
+        lock.release(200, 300)
+        self.assertFalse(any(t.acquired.is_set() for t in (w1, r1, r2)))
+        lock.release(0, 100)
+        self.assertTrue(w1.acquired.wait(timeout=1))
+        self.assertTrue(r2.acquired.wait(timeout=1))
+        # Reader 1 overlaps Writer 1, which got in first:
+        self.assertFalse(r1.acquired.is_set())
+        w1.done.set()
+        self.assertTrue(r1.acquired.wait(timeout=1))
+        self._finish([w1, r1, r2])
+
+    def test_invalid_range(self):
+        lock = RangeSHLock()
+        self.assertRaises(ValueError, lock.acquire, 10, 10)
+        self.assertRaises(RuntimeError, lock.release, 0, 10)
+
+    def test_many_writers_consistency(self):
+        lock = RangeSHLock()
+        data = [0] * 100
+        errors = []
+
+        def writer(seed):
+            rng = random.Random(seed)
+            for _ in range(200):
+                start = rng.randint(0, 90)
+                end = start + rng.randint(1, 10)
+                with lock(start, end):
+                    before = data[start:end]
+                    for i in range(start, end):
+                        data[i] += 1
+                    time.sleep(0)
+                    if [v - 1 for v in data[start:end]] != before:
+                        errors.append((start, end))
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(timeout=10)
+            self.assertFalse(t.is_alive())
+        self.assertEqual([], errors)
+        self.assertEqual(0, len(lock._exclusive_held))
@@ -7,7 +7,7 @@ import io
 import re
 import random
 
-from rwlock import SHLock
+from rwlock import Condition, SHLock
 
 _TYPE_READER = 0
 _TYPE_WRITER = 1
@@ -199,3 +199,219 @@ class RWLockTest(unittest.TestCase):
                     next_line = lines[i + 1]
                     self.assertIsNotNone(_WRITER_OUTPUT_PATTERN.search(next_line))
                     break
+
+
+class _TestThread3(threading.Thread):
+    """A reader thread that holds a shared lock until it is told to let go."""
+
+    def __init__(self, lock, name, active, peak, stats_lock):
+        """Ctor.
+
+        @param SHLock lock:                The lock to acquire in shared mode.
+        @param str name:                   Thread name.
+        @param list active:                Single-element list holding the current number
+                                           of readers inside the lock.
+        @param list peak:                  Single-element list holding the highest value
+                                           seen in "active".
+        @param threading.Lock stats_lock:  Guards "active" and "peak".
+        """
+        threading.Thread.__init__(self, name=name)
+        self.lock = lock
+        self.active = active
+        self.peak = peak
+        self.stats_lock = stats_lock
+        self.acquired = threading.Event()
+        self.done = threading.Event()
+
+    def run(self):
+        with self.lock(shared=True):
+            with self.stats_lock:
+                self.active[0] += 1
+                self.peak[0] = max(self.peak[0], self.active[0])
+            self.acquired.set()
+            self.done.wait(timeout=5)
+            with self.stats_lock:
+                self.active[0] -= 1
+
+
+class _SlowCondition(Condition):
+    """A Condition that is slow to take back its lock after waiting."""
+
+    _RESTORE_DELAY = 0.2  # seconds
+
+    def _acquire_restore(self, saved_state):
+        time.sleep(_SlowCondition._RESTORE_DELAY)
+        super(_SlowCondition, self)._acquire_restore(saved_state)
+
+
+class _SlowSHLock(SHLock):
+    """An SHLock whose waiters are slow to wake up."""
+
+    _ConditionClass = _SlowCondition
+
+
+class SHLockMaxSharedTest(unittest.TestCase):
+    """Unit tests for the max_shared limit of SHLock."""
+
+    def _start_readers(self, lock, count):
+        active, peak, stats_lock = [0], [0], threading.Lock()
+        readers = [_TestThread3(lock, "Reader {}".format(i), active, peak, stats_lock)
+                   for i in range(count)]
+        for t in readers:
+            t.start()
+        return readers, peak
+
+    def _finish(self, threads):
+        for t in threads:
+            t.done.set()
+        for t in threads:
+            t.join(timeout=2)
+            self.assertFalse(t.is_alive())
+
+    def test_invalid_max_shared(self):
+        self.assertRaises(ValueError, SHLock, max_shared=0)
+        lock = SHLock()
+        with self.assertRaises(ValueError):
+            lock.max_shared = -1
+        self.assertIsNone(lock.max_shared)
+        self.assertRaises(TypeError, SHLock, max_shared=2.5)
+        self.assertRaises(TypeError, SHLock, max_shared=True)
+        with self.assertRaises(TypeError):
+            lock.max_shared = "3"
+
+    def test_cap_is_enforced(self):
+        lock = SHLock(max_shared=2)
+        readers, peak = self._start_readers(lock, 5)
+        time.sleep(0.1)
+        self.assertEqual(2, sum(t.acquired.is_set() for t in readers))
+        self.assertEqual(2, len(lock._shared_owners))
+        # Letting the readers go one at a time should pass the slots on:
+        for t in readers:
+            t.done.set()
+            time.sleep(0.02)
+        self._finish(readers)
+        self.assertEqual(2, peak[0])
+        self.assertFalse(lock.is_shared)
+        self.assertFalse(lock._shared_queue)
+
+    def test_last_release_with_readers_queued(self):
+        lock = SHLock(max_shared=1)
+        lock.acquire(shared=True)
+        readers, peak = self._start_readers(lock, 3)
+        time.sleep(0.1)
+        self.assertFalse(any(t.acquired.is_set() for t in readers))
+        # Dropping the only shared owner must admit exactly one queued reader:
+        lock.release()
+        time.sleep(0.1)
+        self.assertEqual(1, sum(t.acquired.is_set() for t in readers))
+        for t in readers:
+            t.done.set()
+            time.sleep(0.02)
+        self._finish(readers)
+        self.assertEqual(1, peak[0])
+        self.assertFalse(lock.is_shared)
+        self.assertFalse(lock._shared_queue)
+
+    def test_acquire_returns_success(self):
+        lock = SHLock(max_shared=1)
+        self.assertTrue(lock.acquire(shared=True))
+        result = []
+        t = threading.Thread(target=lambda: result.append(lock.acquire(shared=True,
+                                                                       timeout=0.05)))
+        t.start()
+        t.join(timeout=2)
+        self.assertEqual([False], result)
+        # Re-entrant, so this succeeds even though we are at the cap:
+        self.assertTrue(lock.acquire(shared=True, blocking=False))
+        lock.release()
+        lock.release()
+
+        def reader():
+            result.append(lock.acquire(shared=True, timeout=1))
+            lock.release()
+
+        lock.acquire(shared=True)
+        t = threading.Thread(target=reader)
+        t.start()
+        time.sleep(0.05)
+        lock.release()
+        t.join(timeout=2)
+        self.assertEqual([False, True], result)
+        self.assertTrue(lock.acquire())
+        lock.release()
+
+    def _check_granted_as_wait_times_out(self, shared):
+        lock = _SlowSHLock(max_shared=1)
+        lock.acquire(shared=shared)
+        result = []
+
+        def waiter():
+            result.append(lock.acquire(shared=shared, timeout=0.05))
+            if result[0]:
+                lock.release()
+
+        t = threading.Thread(target=waiter)
+        t.start()
+        # Release after the waiter has timed out, but while it is still
+        # waiting to take back the internal lock; it gets handed the lock.
+        time.sleep(0.1)
+        lock.release()
+        t.join(timeout=2)
+        self.assertFalse(t.is_alive())
+        self.assertEqual([True], result)
+        self.assertFalse(lock.is_shared)
+        self.assertFalse(lock.is_exclusive)
+        self.assertFalse(lock._shared_owners)
+        self.assertTrue(lock.acquire(shared=True, blocking=False))
+        lock.release()
+
+    def test_shared_granted_as_wait_times_out(self):
+        self._check_granted_as_wait_times_out(True)
+
+    def test_exclusive_granted_as_wait_times_out(self):
+        self._check_granted_as_wait_times_out(False)
+
+    def test_reentrant_shared_ignores_cap(self):
+        lock = SHLock(max_shared=1)
+        lock.acquire(shared=True)
+        lock.acquire(shared=True)
+        self.assertEqual(2, lock.is_shared)
+        lock.release()
+        lock.release()
+        self.assertFalse(lock.is_shared)
+
+    def test_raise_cap_at_runtime(self):
+        lock = SHLock(max_shared=1)
+        readers, peak = self._start_readers(lock, 3)
+        time.sleep(0.1)
+        self.assertEqual(1, sum(t.acquired.is_set() for t in readers))
+        lock.max_shared = 3
+        for t in readers:
+            self.assertTrue(t.acquired.wait(timeout=1))
+        self._finish(readers)
+        self.assertEqual(3, peak[0])
+
+    def test_writer_not_starved(self):
+        lock = SHLock(max_shared=1)
+        readers, _ = self._start_readers(lock, 3)
+        time.sleep(0.1)
+        writer_done = threading.Event()
+        seen_by_writer = []
+
+        def writer():
+            with lock:
+                seen_by_writer.append(sum(t.acquired.is_set() for t in readers))
+            writer_done.set()
+
+        w = threading.Thread(target=writer)
+        w.start()
+        time.sleep(0.05)
+        # Releasing the only reader should hand the lock to the writer first:
+        holder = [t for t in readers if t.acquired.is_set()][0]
+        holder.done.set()
+        self.assertTrue(writer_done.wait(timeout=1))
+        w.join(timeout=1)
+        # The readers queued behind the writer must not have overtaken it:
+        self.assertEqual([1], seen_by_writer)
+        self._finish(readers)
+        self.assertTrue(all(t.acquired.is_set() for t in readers))